@@ -1,7 +1,10 @@
 # backend/api/chat.py
-import io
-from fastapi import APIRouter, HTTPException
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Response
 from fastapi.responses import StreamingResponse
+from core import replay
+from core.loop_watchdog import watchdog
 
 # Import all schemas
 from schemas import (
@@ -12,22 +15,44 @@ from schemas import (
 # Import all services
 from services import (
     itinerary_service, pdf_service, email_service,
-    flight_service, hotel_service, youtube_service, calendar_service
+    flight_service, hotel_service, youtube_service, calendar_service,
+    idempotency_service, model_router_service
 )
 
 router = APIRouter()
 
 # --- Main Itinerary Endpoint ---
 @router.post("/chat", response_model=ItineraryResponse, tags=["Main Flow"])
-async def chat_with_agent(request: ChatRequest): # <-- This now correctly uses the ChatRequest model
+async def chat_with_agent(
+    request: ChatRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
     try:
-        # --- THIS IS THE FIX ---
-        # We now pass the entire 'request' object to the service,
-        # not just the prompt string.
-        final_itinerary = await itinerary_service.create_full_itinerary(request)
-        # --- END OF FIX ---
+        # Retried submissions share one pipeline run (and one set of emails/invites)
+        fingerprint = idempotency_service.derive_key(request.model_dump())
+        key = idempotency_key or fingerprint
+        response.headers["Idempotency-Key"] = key
+
+        async def run_pipeline():
+            # Records or replays the upstream calls when REPLAY_MODE is set
+            async with replay.session(key):
+                # Actions are bound to the body too, so a reused key can't suppress another request's email
+                return await itinerary_service.create_full_itinerary(
+                    request,
+                    action_key=f"{key}:{fingerprint}",
+                    action_claim_seconds=idempotency_service.action_claim_lifetime(idempotency_key is not None)
+                )
+
+        if replay.REPLAY_ENABLED:
+            # Cached results would answer a repeated record/replay run without running the pipeline
+            final_itinerary = await run_pipeline()
+        else:
+            final_itinerary = await idempotency_service.run_once(key, fingerprint, run_pipeline)
         
         return ItineraryResponse(itinerary=final_itinerary)
+    except idempotency_service.IdempotencyKeyMismatch as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -35,11 +60,21 @@ async def chat_with_agent(request: ChatRequest): # <-- This now correctly uses t
 @router.post("/download-pdf", tags=["Utilities"])
 async def download_pdf(request: PdfRequest):
     try:
-        pdf_bytes = pdf_service.create_pdf_from_itinerary(request.markdown_text)
+        # The PDF is rendered straight to a private temp file and streamed back in chunks
+        # with a Content-Length header; the stream removes the file when it finishes or is closed.
+        pdf_path = await pdf_service.create_private_pdf_file_async(request.markdown_text)
+        try:
+            pdf_size = os.path.getsize(pdf_path)
+        except OSError:
+            await pdf_service.remove_pdf_file_async(pdf_path)
+            raise
         return StreamingResponse(
-            io.BytesIO(pdf_bytes), 
-            media_type='application/pdf', 
-            headers={'Content-Disposition': 'attachment; filename=itinerary.pdf'}
+            pdf_service.iter_pdf_file(pdf_path),
+            media_type='application/pdf',
+            headers={
+                'Content-Disposition': 'attachment; filename=itinerary.pdf',
+                'Content-Length': str(pdf_size)
+            }
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to generate PDF.")
@@ -52,6 +87,16 @@ async def send_email(request: EmailRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/model-routing", tags=["Utilities"])
+async def model_routing_stats():
+    """ Returns per-model latency/error stats and recent routing decisions. """
+    return model_router_service.get_routing_stats()
+
+@router.get("/loop-health", tags=["Utilities"])
+async def loop_health():
+    """ Returns the event-loop lag histogram and the stacks of recent stalls. """
+    return watchdog.snapshot()
+
 # --- Feature Test Endpoints ---
 @router.post("/find-flights", tags=["Feature Tests"])
 async def find_flights(request: FlightRequest):
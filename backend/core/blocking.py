@@ -0,0 +1,50 @@
+# backend/core/blocking.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Optional
+from core.config import BLOCKING_POOL_WORKERS
+
+# Pools for blocking work that must not run on the event loop, created on first use
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_executor(use_process: bool):
+    global _thread_pool, _process_pool
+    if use_process:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=BLOCKING_POOL_WORKERS)
+        return _process_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_WORKERS, thread_name_prefix="blocking")
+    return _thread_pool
+
+async def run_blocking(func: Callable, *args, use_process: bool = False, **kwargs):
+    """
+    Runs a blocking function in the thread pool (or the process pool, for CPU-bound
+    work with picklable arguments) and awaits its result without stalling the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(use_process), functools.partial(func, *args, **kwargs)
+    )
+
+def offload(func: Callable):
+    """
+    Decorator that turns a known-blocking function into an awaitable one that runs in the
+    thread pool. Process-pool offloading isn't supported here, because the decorated name
+    no longer refers to a picklable function; use run_blocking(func, use_process=True).
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+    return wrapper
+
+def shutdown():
+    """ Shuts down the pools; called when the app stops. """
+    global _thread_pool, _process_pool
+    for pool in (_thread_pool, _process_pool):
+        if pool is not None:
+            pool.shutdown(wait=False)
+    _thread_pool = None
+    _process_pool = None
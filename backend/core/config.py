@@ -15,6 +15,37 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 TEMP_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp')
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+# --- Idempotency Settings ---
+# How long completed /api/chat results are kept for duplicate submissions
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+# How long a key keeps its post-generation actions (email, calendar) from firing again,
+# even after its cached result has expired and the pipeline is rerun
+IDEMPOTENCY_ACTIONS_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_ACTIONS_TTL_SECONDS", str(24 * 60 * 60)))
+
+# --- Gemini Model Tiers ---
+# The model router picks between these per call (see services/model_router_service.py)
+FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-1.5-flash")
+QUALITY_MODEL = os.getenv("GEMINI_QUALITY_MODEL", "gemini-1.5-pro")
+# Portia agents run tool-heavy research, so they stay on the fast tier by default
+PORTIA_MODEL = os.getenv("PORTIA_MODEL", FAST_MODEL)
+# A primary model call slower than this falls back to the fast tier
+MODEL_SLOW_TIMEOUT_SECONDS = float(os.getenv("MODEL_SLOW_TIMEOUT_SECONDS", "45"))
+# Optional JSONL file where every routing decision and its outcome is appended
+MODEL_ROUTING_LOG_PATH = os.getenv("MODEL_ROUTING_LOG_PATH")
+
+# --- Event Loop Health ---
+# A heartbeat delayed by more than this is reported as a stall, with the blocking stack
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+# Worker count for the pool that blocking service calls are offloaded to
+BLOCKING_POOL_WORKERS = int(os.getenv("BLOCKING_POOL_WORKERS", "4"))
+
+# --- Destination Skeletons ---
+# Comma-separated list of popular destinations whose generic research is precomputed
+SKELETON_DESTINATIONS = [d.strip() for d in os.getenv("SKELETON_DESTINATIONS", "").split(",") if d.strip()]
+SKELETON_REFRESH_SECONDS = float(os.getenv("SKELETON_REFRESH_SECONDS", str(6 * 60 * 60)))
+SKELETON_DIR = os.getenv("SKELETON_DIR", os.path.join(os.path.dirname(__file__), '..', 'skeletons'))
+
 # --- Portia Agent Initialization ---
 portia_agent = None
 emailer_agent = None
@@ -27,7 +58,7 @@ try:
     # Base configuration for Portia agents
     base_config = Config.from_default(
         llm_provider=LLMProvider.GOOGLE,
-        default_model="google/gemini-1.5-flash",
+        default_model=f"google/{PORTIA_MODEL}",
         portia_api_key=os.getenv("PORTIA_API_KEY")
     )
 
@@ -43,4 +74,9 @@ except Exception as e:
     print(f"❌ Error initializing Portia Agents: {e}")
     # Set agents to None if initialization fails
     portia_agent = None
-    emailer_agent = None
\ No newline at end of file
+    emailer_agent = None
+
+# --- Record / Replay Harness ---
+# Wraps the agents (or substitutes stand-ins in replay mode) when REPLAY_MODE is set
+from core import replay
+portia_agent, emailer_agent = replay.install(portia_agent, emailer_agent)
@@ -0,0 +1,111 @@
+# backend/core/loop_watchdog.py
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+from core.config import LOOP_LAG_THRESHOLD_MS
+
+# Upper bounds (in ms) of the lag histogram buckets; the last bucket catches everything above
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf")]
+# How often the heartbeat runs on the event loop
+HEARTBEAT_INTERVAL_SECONDS = 0.05
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag with a heartbeat task and watches it from a separate thread.
+    When the heartbeat stops for longer than the threshold, the watcher thread captures
+    the loop thread's current stack, i.e. the code that is blocking the loop.
+    """
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.histogram = [0] * len(LAG_BUCKETS_MS)
+        self.max_lag_ms = 0.0
+        self.stalls: deque = deque(maxlen=50)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._current_stall: Optional[dict] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """ Starts the heartbeat on the running loop and the watcher thread. """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        print(f"Loop Watchdog: Monitoring event loop (stall threshold {self.threshold * 1000:.0f}ms).")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + HEARTBEAT_INTERVAL_SECONDS
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            now = time.monotonic()
+            self._record_lag(max(now - expected, 0.0) * 1000)
+            self._last_beat = now
+
+    def _record_lag(self, lag_ms: float):
+        for index, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.histogram[index] += 1
+                break
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        stall = self._current_stall
+        if stall is not None:
+            # The loop is running again; record how long the stall really lasted
+            stall["total_lag_ms"] = round(lag_ms, 1)
+            self._current_stall = None
+
+    def _watch(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL_SECONDS):
+            # Measure from when the next beat was due, not from the last one,
+            # so the heartbeat's own sleep isn't counted as lag
+            blocked_for = time.monotonic() - (self._last_beat + HEARTBEAT_INTERVAL_SECONDS)
+            if blocked_for > self.threshold and self._current_stall is None:
+                self._capture_stall(blocked_for)
+
+    def _capture_stall(self, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame else []
+        try:
+            task = asyncio.current_task(self._loop)
+            task_name = f"{task.get_name()}: {task.get_coro()!r}" if task else None
+        except RuntimeError:
+            task_name = None
+
+        stall = {
+            "timestamp": time.time(),
+            "blocked_for_ms": round(blocked_for * 1000, 1),
+            "total_lag_ms": None,
+            "task": task_name,
+            "stack": [line.rstrip() for line in stack[-15:]],
+        }
+        self._current_stall = stall
+        self.stalls.append(stall)
+        location = stall["stack"][-1].strip().splitlines()[0] if stall["stack"] else "unknown location"
+        print(f"Loop Watchdog: Event loop blocked for {stall['blocked_for_ms']}ms+ in {location}")
+
+    def snapshot(self) -> dict:
+        """ Returns the lag histogram, the maximum lag and the most recent stalls. """
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "lag_histogram_ms": {
+                ("+inf" if bound == float("inf") else f"<={bound}"): count
+                for bound, count in zip(LAG_BUCKETS_MS, self.histogram)
+            },
+            "recent_stalls": list(self.stalls),
+        }
+
+# A single, process-wide watchdog started with the app
+watchdog = LoopWatchdog()
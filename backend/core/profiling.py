@@ -0,0 +1,50 @@
+# backend/core/profiling.py
+# Optional per-stage profiling for the itinerary pipeline. When PROFILE_DIR is set,
+# each stage is timed and run under cProfile, and a .prof file (readable with pstats,
+# snakeviz, etc.) is written per stage. The "Profile:" log lines mark stage boundaries
+# so they can be lined up with an external sampler such as py-spy.
+import contextlib
+import cProfile
+import hashlib
+import os
+import time
+import uuid
+
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+# cProfile hooks the whole thread, so only one stage can be profiled at a time
+_profiler_active = False
+
+@contextlib.contextmanager
+def profile_stage(stage: str, request_label: str = "request"):
+    """
+    Times the code inside the block and, if no other stage is currently being
+    profiled, captures a cProfile dump for it. Does nothing when PROFILE_DIR is unset.
+    Note that awaits inside the block also profile other coroutines running on the loop.
+    """
+    global _profiler_active
+    if not PROFILE_DIR:
+        yield
+        return
+
+    profiler = None
+    if not _profiler_active:
+        profiler = cProfile.Profile()
+        _profiler_active = True
+        profiler.enable()
+
+    # The label can come from a client header, so only a hash of it is logged or used in filenames
+    label_id = hashlib.sha256(request_label.encode("utf-8")).hexdigest()[:16]
+    started = time.perf_counter()
+    print(f"Profile: [{label_id}] stage '{stage}' started.")
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        print(f"Profile: [{label_id}] stage '{stage}' finished in {elapsed:.3f}s.")
+        if profiler:
+            profiler.disable()
+            _profiler_active = False
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            filename = f"{label_id}-{stage}-{uuid.uuid4().hex[:8]}.prof"
+            profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
@@ -0,0 +1,287 @@
+# backend/core/replay.py
+# Record mode captures every Portia agent run, Gemini call and 'requests' HTTP call
+# made inside a session, with timings, into a gzipped JSONL file. Replay mode answers
+# the same calls from that file, so slow requests can be profiled without live services.
+#
+#   REPLAY_MODE           "record", "replay" or unset (disabled)
+#   REPLAY_DIR            Directory for recordings (default: backend/recordings)
+#   REPLAY_LATENCY_SCALE  Multiplier for recorded latencies (default: 1.0, 0 = no waiting)
+#
+# Calls the caller cancelled while recording (e.g. a model router timeout) are replayed
+# as calls that never finish, so the caller's own timeout cancels them again.
+import asyncio
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from typing import Optional
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+import requests
+import google.generativeai as genai
+
+REPLAY_MODE = (os.getenv("REPLAY_MODE") or "").strip().lower()
+REPLAY_DIR = os.getenv("REPLAY_DIR", os.path.join(os.path.dirname(__file__), '..', 'recordings'))
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1.0"))
+REPLAY_ENABLED = REPLAY_MODE in ("record", "replay")
+
+# Query parameters that carry credentials and must never be written to a recording
+SECRET_PARAMS = {"key", "appid", "api_key", "apikey", "token", "access_token"}
+
+class ReplaySession:
+    """ The interactions recorded for, or replayed into, a single /api/chat request. """
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        # The name comes from the client's Idempotency-Key header, so it is hashed
+        # rather than ever being joined into a filesystem path as-is
+        self.path = os.path.join(REPLAY_DIR, f"{session_file_id(name)}.jsonl.gz")
+        self.recorded: list[dict] = []
+        self.pending: dict[str, deque] = defaultdict(deque)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            raise Exception(f"No recording found for replay session at {self.path}")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.pending[entry["key"]].append(entry)
+        print(f"Replay: Loaded {sum(len(q) for q in self.pending.values())} interactions from {self.path}")
+
+    def save(self):
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            for entry in self.recorded:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        print(f"Replay: Recorded {len(self.recorded)} interactions to {self.path}")
+
+    def record(self, kind: str, key: str, latency: float, response=None, error: Optional[str] = None,
+               outcome: Optional[str] = None):
+        """ Stores one interaction; 'outcome' is "ok", "error" or "cancelled" (derived when omitted). """
+        self.recorded.append({
+            "kind": kind,
+            "key": key,
+            "latency": round(latency, 4),
+            "outcome": outcome or ("ok" if error is None else "error"),
+            "response": response,
+            "error": error,
+        })
+
+    def take(self, kind: str, key: str) -> dict:
+        if not self.pending[key]:
+            raise Exception(f"Replay: No recorded '{kind}' interaction matches this call (key {key[:12]}).")
+        return self.pending[key].popleft()
+
+def session_file_id(name: str) -> str:
+    """ Returns the filesystem-safe identifier used to name a session's recording. """
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+_current_session: contextvars.ContextVar[Optional[ReplaySession]] = contextvars.ContextVar("replay_session", default=None)
+
+@contextlib.asynccontextmanager
+async def session(name: str):
+    """
+    Activates recording or replay for the code run inside the block.
+    Tasks created inside the block inherit the session (use create_detached_task to opt out).
+    Does nothing when REPLAY_MODE is unset.
+    """
+    if not REPLAY_ENABLED:
+        yield None
+        return
+
+    # Imported here because core.config imports this module while it is still loading
+    from core.blocking import run_blocking
+
+    replay_session = ReplaySession(name, REPLAY_MODE)
+    if replay_session.mode == "replay":
+        await run_blocking(replay_session.load)
+    token = _current_session.set(replay_session)
+    try:
+        yield replay_session
+    finally:
+        _current_session.reset(token)
+        if replay_session.mode == "record":
+            await run_blocking(replay_session.save)
+
+def create_detached_task(coroutine) -> asyncio.Task:
+    """
+    Starts a task that runs outside any active session, for background work that
+    outlives the request (its calls are neither recorded nor replayed).
+    """
+    context = contextvars.copy_context()
+    context.run(_current_session.set, None)
+    # A task copies the context it is created in, so create it inside the detached one
+    return context.run(asyncio.create_task, coroutine)
+
+def _make_key(kind: str, *parts) -> str:
+    raw = json.dumps([kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _scaled(latency: float) -> float:
+    return max(latency * REPLAY_LATENCY_SCALE, 0.0)
+
+async def _replay_async(entry: dict):
+    """
+    Waits out a recorded async call. Errors are raised again; a call that was cancelled while
+    recording never finishes, so it is cut off by the caller's timeout just like the original.
+    """
+    await asyncio.sleep(_scaled(entry["latency"]))
+    if entry.get("outcome") == "cancelled":
+        await asyncio.Event().wait()
+    if entry["error"] is not None:
+        raise Exception(entry["error"])
+
+# --- Portia agent runs ---
+class ReplayRunResult:
+    """ Stand-in for a Portia plan run result, exposing the fields the services use. """
+    def __init__(self, final_output, dump: Optional[dict] = None):
+        self.outputs = SimpleNamespace(final_output=final_output)
+        self._dump = dump or {"outputs": {"final_output": final_output}}
+
+    def model_dump(self, **kwargs) -> dict:
+        return self._dump
+
+class ReplayAgent:
+    """ Stand-in agent used in replay mode, when no real Portia agent could be initialized. """
+    def __init__(self, name: str):
+        self.name = name
+
+    async def arun(self, query: str, *args, **kwargs):
+        raise Exception(f"Replay: '{self.name}' was called outside of a replay session.")
+
+def _wrap_agent(agent, name: str):
+    original_arun = agent.arun
+
+    async def arun(query: str, *args, **kwargs):
+        replay_session = _current_session.get()
+        if replay_session is None:
+            return await original_arun(query, *args, **kwargs)
+
+        key = _make_key(f"portia:{name}", query)
+        if replay_session.mode == "replay":
+            entry = replay_session.take("portia", key)
+            await _replay_async(entry)
+            return ReplayRunResult(entry["response"]["final_output"], entry["response"].get("dump"))
+
+        started = time.monotonic()
+        try:
+            result = await original_arun(query, *args, **kwargs)
+        except asyncio.CancelledError:
+            replay_session.record("portia", key, time.monotonic() - started, outcome="cancelled")
+            raise
+        except Exception as e:
+            replay_session.record("portia", key, time.monotonic() - started, error=str(e))
+            raise
+        try:
+            dump = result.model_dump(mode="json")
+        except Exception:
+            dump = None
+        replay_session.record("portia", key, time.monotonic() - started, response={
+            "final_output": str(result.outputs.final_output),
+            "dump": dump,
+        })
+        return result
+
+    agent.arun = arun
+    return agent
+
+# --- Gemini calls ---
+_original_generate_content_async = genai.GenerativeModel.generate_content_async
+
+async def _generate_content_async(self, contents, *args, **kwargs):
+    replay_session = _current_session.get()
+    if replay_session is None:
+        return await _original_generate_content_async(self, contents, *args, **kwargs)
+
+    key = _make_key("gemini", self.model_name, contents)
+    if replay_session.mode == "replay":
+        entry = replay_session.take("gemini", key)
+        await _replay_async(entry)
+        return SimpleNamespace(text=entry["response"]["text"])
+
+    started = time.monotonic()
+    try:
+        response = await _original_generate_content_async(self, contents, *args, **kwargs)
+    except asyncio.CancelledError:
+        # Typically the model router's timeout; recorded so replay times out at the same point
+        replay_session.record("gemini", key, time.monotonic() - started, outcome="cancelled")
+        raise
+    except Exception as e:
+        replay_session.record("gemini", key, time.monotonic() - started, error=str(e))
+        raise
+    replay_session.record("gemini", key, time.monotonic() - started, response={"text": response.text})
+    return response
+
+# --- Tool HTTP calls (requests, which googlemaps also uses) ---
+_original_session_request = requests.Session.request
+
+def _public_params(params) -> list:
+    if not params:
+        return []
+    items = params.items() if isinstance(params, dict) else params
+    return sorted((k, str(v)) for k, v in items if str(k).lower() not in SECRET_PARAMS)
+
+def _public_url(url: str) -> str:
+    # Some clients (e.g. googlemaps) put the API key in the URL itself
+    parts = urlsplit(url)
+    query = urlencode(_public_params(parse_qsl(parts.query)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, parts.fragment))
+
+def _session_request(self, method, url, *args, **kwargs):
+    replay_session = _current_session.get()
+    if replay_session is None:
+        return _original_session_request(self, method, url, *args, **kwargs)
+
+    params = _public_params(kwargs.get("params"))
+    key = _make_key("http", method.upper(), _public_url(url), params)
+    if replay_session.mode == "replay":
+        entry = replay_session.take("http", key)
+        # Tools are synchronous, so replay keeps them blocking like the real call
+        time.sleep(_scaled(entry["latency"]))
+        if entry["error"] is not None:
+            raise requests.exceptions.ConnectionError(entry["error"])
+        response = requests.Response()
+        response.status_code = entry["response"]["status_code"]
+        response._content = entry["response"]["text"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = _public_url(url)
+        return response
+
+    started = time.monotonic()
+    try:
+        response = _original_session_request(self, method, url, *args, **kwargs)
+    except requests.exceptions.RequestException as e:
+        replay_session.record("http", key, time.monotonic() - started, error=str(e))
+        raise
+    replay_session.record("http", key, time.monotonic() - started, response={
+        "status_code": response.status_code,
+        "text": response.text,
+    })
+    return response
+
+def install(portia_agent, emailer_agent):
+    """
+    Hooks the harness into the agents and client libraries when REPLAY_MODE is set.
+    Returns the (possibly replaced) agents; in replay mode, missing agents are
+    substituted with stand-ins so the pipeline runs without API keys.
+    """
+    if not REPLAY_ENABLED:
+        return portia_agent, emailer_agent
+
+    if REPLAY_MODE == "replay":
+        portia_agent = portia_agent or ReplayAgent("portia_agent")
+        emailer_agent = emailer_agent or ReplayAgent("emailer_agent")
+
+    if portia_agent:
+        portia_agent = _wrap_agent(portia_agent, "portia_agent")
+    if emailer_agent:
+        emailer_agent = _wrap_agent(emailer_agent, "emailer_agent")
+    genai.GenerativeModel.generate_content_async = _generate_content_async
+    requests.Session.request = _session_request
+
+    print(f"Replay: Harness installed in '{REPLAY_MODE}' mode (recordings in {REPLAY_DIR}).")
+    return portia_agent, emailer_agent
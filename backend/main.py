@@ -4,6 +4,9 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from api import chat  # Import the router from our api module
 from core import config # This ensures agents are initialized on startup
+from core import blocking
+from core.loop_watchdog import watchdog
+from services import skeleton_service
 
 # --- FastAPI App Initialization & CORS ---
 app = FastAPI(
@@ -20,6 +23,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Event Loop Health ---
+# The watchdog reports any handler that blocks the event loop (see /api/loop-health)
+@app.on_event("startup")
+async def start_loop_watchdog():
+    if config.LOOP_WATCHDOG_ENABLED:
+        watchdog.start()
+
+# --- Destination Skeletons ---
+# Precomputes generic research for popular destinations off the request path
+@app.on_event("startup")
+async def start_skeleton_warmer():
+    await skeleton_service.start_warmer()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    skeleton_service.stop_warmer()
+    watchdog.stop()
+    blocking.shutdown()
+
 # --- Mount Static Files ---
 # This makes the 'temp' directory publicly accessible for file downloads
 app.mount("/temp", StaticFiles(directory=config.TEMP_DIR), name="temp")
@@ -8,6 +8,7 @@ class PromptRequest(BaseModel):
     user_email: str
     send_copy_to: Optional[str] = None # This field is now optional
     calendar_attendees: Optional[List[str]] = Field(default_factory=list) # Optional list of emails
+    latency_budget_seconds: Optional[float] = Field(default=None, gt=0) # Optional time budget used for model routing
 
 class ItineraryResponse(BaseModel):
     itinerary: str
@@ -1,8 +1,7 @@
 # backend/services/email_service.py
 import os
-import uuid
-from core.config import emailer_agent, TEMP_DIR
-from services.pdf_service import create_pdf_from_itinerary
+from core.config import emailer_agent
+from services.pdf_service import create_pdf_file_async, remove_pdf_file_async
 
 async def send_itinerary_email(email: str, markdown_text: str):
     """
@@ -15,16 +14,12 @@ async def send_itinerary_email(email: str, markdown_text: str):
     if not ngrok_url:
         raise Exception("NGROK_URL not configured in .env file.")
 
-    # Create a unique filename for the temporary PDF
-    temp_filename = f"{uuid.uuid4()}.pdf"
-    temp_filepath = os.path.join(TEMP_DIR, temp_filename)
-    
+    # Render the PDF straight into the public temp directory
+    temp_filepath = await create_pdf_file_async(markdown_text)
+    temp_filename = os.path.basename(temp_filepath)
+    print(f"Generated temporary PDF for email: {temp_filename}")
+
     try:
-        print(f"Generating temporary PDF for email: {temp_filename}")
-        pdf_bytes = create_pdf_from_itinerary(markdown_text)
-        with open(temp_filepath, "wb") as f:
-            f.write(pdf_bytes)
-        
         # Construct the public URL for the PDF file
         public_pdf_url = f"{ngrok_url}/temp/{temp_filename}"
         print(f"PDF available at public URL: {public_pdf_url}")
@@ -42,6 +37,4 @@ async def send_itinerary_email(email: str, markdown_text: str):
 
     finally:
         # Ensure the temporary file is always cleaned up
-        if os.path.exists(temp_filepath):
-            os.remove(temp_filepath)
-            print(f"Cleaned up temporary file: {temp_filename}")
\ No newline at end of file
+        await remove_pdf_file_async(temp_filepath)
@@ -0,0 +1,93 @@
+# backend/services/idempotency_service.py
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional
+from core.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_ACTIONS_TTL_SECONDS
+
+class IdempotencyKeyMismatch(Exception):
+    """ Raised when an idempotency key is reused with a different request body. """
+
+# key -> {"fingerprint", "task", "completed_at"} for running or completed pipeline runs
+_inflight_results: dict[str, dict] = {}
+# key -> time until which the post-generation actions stay claimed
+_claimed_actions: dict[str, float] = {}
+
+def derive_key(payload: dict) -> str:
+    """
+    Builds a stable key from a request payload. Used as the idempotency key when the
+    client didn't send an 'Idempotency-Key' header, and as the body fingerprint otherwise.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _prune_expired() -> None:
+    """
+    Drops results completed more than IDEMPOTENCY_TTL_SECONDS ago and expired action claims.
+    In-progress tasks are never pruned.
+    """
+    now = time.monotonic()
+    for key, entry in list(_inflight_results.items()):
+        completed_at = entry["completed_at"]
+        if completed_at is not None and completed_at < now - IDEMPOTENCY_TTL_SECONDS:
+            del _inflight_results[key]
+    for key, claimed_until in list(_claimed_actions.items()):
+        if claimed_until < now:
+            del _claimed_actions[key]
+
+async def run_once(key: str, fingerprint: str, coroutine_factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Runs the coroutine produced by 'coroutine_factory' at most once per key.
+    Duplicate submissions await the in-progress task or get the completed result.
+    Reusing a key with a different 'fingerprint' (request body) raises IdempotencyKeyMismatch.
+    Failed runs are forgotten so a later retry can try again.
+    """
+    _prune_expired()
+
+    entry = _inflight_results.get(key)
+    if entry:
+        if entry["fingerprint"] != fingerprint:
+            raise IdempotencyKeyMismatch("Idempotency-Key was already used with a different request body.")
+        task = entry["task"]
+        if task.done() and (task.cancelled() or task.exception() is not None):
+            del _inflight_results[key]
+        else:
+            print(f"Idempotency: Reusing {'completed' if task.done() else 'in-progress'} result for key {key[:12]}...")
+            # Shield the shared task so one client disconnecting doesn't cancel it for the others
+            return await asyncio.shield(task)
+
+    task = asyncio.create_task(coroutine_factory())
+    entry = {"fingerprint": fingerprint, "task": task, "completed_at": None}
+    # The result TTL runs from completion, not from when the run started
+    task.add_done_callback(lambda _: entry.update(completed_at=time.monotonic()))
+    _inflight_results[key] = entry
+    try:
+        # If the client goes away, the shielded task keeps running so a retry can pick it up
+        return await asyncio.shield(task)
+    except Exception:
+        if _inflight_results.get(key) is entry:
+            del _inflight_results[key]
+        raise
+
+def action_claim_lifetime(client_supplied_key: bool) -> int:
+    """
+    How long a key's post-generation actions stay claimed. Client-supplied keys get the long
+    IDEMPOTENCY_ACTIONS_TTL_SECONDS; keys derived from the body only live as long as the
+    cached result, so resubmitting the same prompt later still sends the email and invite.
+    """
+    return IDEMPOTENCY_ACTIONS_TTL_SECONDS if client_supplied_key else IDEMPOTENCY_TTL_SECONDS
+
+def claim_actions(key: Optional[str], lifetime_seconds: float = IDEMPOTENCY_ACTIONS_TTL_SECONDS) -> bool:
+    """
+    Returns True the first time it is called for a key, False afterwards (for
+    'lifetime_seconds'). Used to guarantee post-generation actions (email, calendar)
+    fire only once. A missing key always returns True.
+    """
+    if key is None:
+        return True
+    _prune_expired()
+    if key in _claimed_actions:
+        return False
+    _claimed_actions[key] = time.monotonic() + lifetime_seconds
+    return True
@@ -1,14 +1,16 @@
 # backend/services/itinerary_service.py
 import json
 import asyncio
-import google.generativeai as genai
+import time
+from typing import Optional
 from schemas import PromptRequest as ChatRequest
 from core.config import portia_agent
-from services import flight_service, hotel_service, youtube_service, email_service, calendar_service
+from core.profiling import profile_stage
+from core import replay
+from services import flight_service, hotel_service, youtube_service, email_service, calendar_service, idempotency_service, model_router_service, skeleton_service, research_planning_service
 
 # The get_structured_master_plan function is correct and does not need changes.
-async def get_structured_master_plan(user_prompt: str) -> dict:
-    planner_model = genai.GenerativeModel('gemini-1.5-flash')
+async def get_structured_master_plan(user_prompt: str, deadline: Optional[float] = None) -> dict:
     prompt = (
         "You are a travel planning assistant. Your job is to parse a user's request and extract key information into a structured JSON object. "
         "Identify the destination, travel dates, number of travelers, and any specific features they request (flights, hotels, youtube). "
@@ -17,7 +19,7 @@ async def get_structured_master_plan(user_prompt: str) -> dict:
         "JSON Output:"
     )
     try:
-        response = await planner_model.generate_content_async(prompt)
+        response = await model_router_service.generate_content("planning", prompt, deadline=deadline)
         json_response = response.text.strip().replace("```json", "").replace("```", "")
         plan = json.loads(json_response)
         return plan if isinstance(plan, dict) else {}
@@ -26,16 +28,39 @@ async def get_structured_master_plan(user_prompt: str) -> dict:
         return {}
 
 
+# Keeps references to running post-generation action tasks so they aren't garbage collected
+_background_actions: set = set()
+
+async def _run_post_generation_actions(action_coroutines: list):
+    results = await asyncio.gather(*action_coroutines, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Stage 4 Error: A post-generation action failed: {result}")
+
+
 # --- THIS IS THE CORRECTED FUNCTION ---
-async def create_full_itinerary(request: ChatRequest) -> str:
+async def create_full_itinerary(
+    request: ChatRequest,
+    action_key: Optional[str] = None,
+    action_claim_seconds: Optional[float] = None
+) -> str:
     """
     Orchestrates the entire process: itinerary generation AND post-generation actions.
+    When 'action_key' is given, the post-generation actions fire at most once for that key
+    (within 'action_claim_seconds', defaulting to IDEMPOTENCY_ACTIONS_TTL_SECONDS).
     """
     if not portia_agent:
         raise Exception("Research Agent not initialized.")
 
+    # The optional per-request latency budget becomes a deadline shared by all model calls
+    deadline = None
+    if request.latency_budget_seconds is not None:
+        deadline = time.monotonic() + request.latency_budget_seconds
+
     print(f"Stage 1: Creating master plan for prompt: '{request.main_prompt}'")
-    master_plan = await get_structured_master_plan(request.main_prompt)
+    profile_label = action_key or "request"
+    with profile_stage("planning", profile_label):
+        master_plan = await get_structured_master_plan(request.main_prompt, deadline=deadline)
     if not master_plan:
         raise Exception("Failed to create a structured master plan.")
     print(f"Master plan created: {master_plan}")
@@ -46,6 +71,13 @@ async def create_full_itinerary(request: ChatRequest) -> str:
     # --- FIX START ---
     # Correctly parse the 'features' dictionary from the master plan
     features = master_plan.get("features", {})
+
+    # A precomputed skeleton for popular destinations replaces the generic research and vlogs,
+    # leaving only the user-specific lookups (flights, hotels, specific topics) on the request path
+    skeleton = skeleton_service.get_skeleton(master_plan.get("destination"))
+    use_skeleton_vlogs = bool(skeleton and features.get("youtube") and skeleton.get("youtube"))
+    if skeleton:
+        print(f"Using research skeleton v{skeleton['version']} for '{skeleton['destination']}'.")
     
     if features.get("flights"): # Check the boolean value in the dictionary
         research_coroutines.append(flight_service.find_flight_info(
@@ -61,21 +93,29 @@ async def create_full_itinerary(request: ChatRequest) -> str:
             guests=master_plan.get("num_travelers", 1)
         ))
 
-    if features.get("youtube"): # Check the boolean value in the dictionary
+    if features.get("youtube") and not use_skeleton_vlogs: # Check the boolean value in the dictionary
         research_coroutines.append(youtube_service.find_youtube_vlogs(
             topic=f"travel in {master_plan.get('destination')}"
         ))
 
-    # Correctly get the list of topics from the 'research_topics' key
-    for topic in master_plan.get("research_topics", []):
-        research_coroutines.append(portia_agent.arun(topic))
+    # Deduplicate and merge the general topics before sending them to the research agent
+    is_covered = None
+    if skeleton:
+        destination = master_plan.get("destination")
+        is_covered = lambda topic: skeleton_service.covers_topic(topic, destination)
+    research_prompts = research_planning_service.plan_research_tasks(
+        master_plan.get("research_topics", []), features, is_covered
+    )
+    for research_prompt in research_prompts:
+        research_coroutines.append(portia_agent.arun(research_prompt))
     # --- FIX END ---
 
-    if not research_coroutines:
+    if not research_coroutines and not skeleton:
         print("Warning: No research tasks were generated from the master plan.")
         return "I was able to create a plan, but couldn't identify specific research tasks. Could you try rephrasing your request?"
 
-    research_results = await asyncio.gather(*research_coroutines, return_exceptions=True)
+    with profile_stage("research", profile_label):
+        research_results = await asyncio.gather(*research_coroutines, return_exceptions=True)
     
     print("Stage 3: Aggregating and synthesizing all research...")
     collected_research = ""
@@ -88,20 +128,18 @@ async def create_full_itinerary(request: ChatRequest) -> str:
     if features.get("hotels"):
         collected_research += f"## Hotel Options:\n{research_results[result_index]}\n\n"
         result_index += 1
-    if features.get("youtube"):
+    if use_skeleton_vlogs:
+        collected_research += f"## Recommended YouTube Vlogs:\n{skeleton['youtube']}\n\n"
+    elif features.get("youtube"):
         collected_research += f"## Recommended YouTube Vlogs:\n{research_results[result_index]}\n\n"
         result_index += 1
     
     collected_research += "## General Travel Research:\n"
+    if skeleton:
+        collected_research += skeleton["general_research"]
     # The rest of the results are from the generic topics
-    for i in range(result_index, len(research_results)):
-        result = research_results[i]
-        if isinstance(result, Exception):
-            collected_research += "- Research failed for one topic.\n"
-        else:
-            collected_research += f"- {str(result.outputs.final_output)}\n"
+    collected_research += research_planning_service.format_research_results(research_results[result_index:])
 
-    synthesizer_model = genai.GenerativeModel('gemini-1.5-flash')
     synthesis_prompt = (
         "You are an expert travel itinerary creator. You will be given pre-researched text, clearly separated by headings for flights, hotels, vlogs, and general topics. "
         "Your task is to synthesize all of this information into a single, cohesive, and beautifully formatted travel itinerary using markdown. "
@@ -110,10 +148,21 @@ async def create_full_itinerary(request: ChatRequest) -> str:
         f"--- RAW RESEARCH DATA ---\n{collected_research}\n--- END RAW RESEARCH DATA ---"
     )
     
-    synthesis_result = await synthesizer_model.generate_content_async(synthesis_prompt)
+    with profile_stage("synthesis", profile_label):
+        synthesis_result = await model_router_service.generate_content("synthesis", synthesis_prompt, deadline=deadline)
     final_itinerary = synthesis_result.text
     print("Stage 3: Master synthesis complete.")
 
+    if replay.REPLAY_MODE == "replay":
+        # Never send real emails or invites while replaying a recording
+        print("Stage 4: Skipping post-generation actions while replaying a recording.")
+        return final_itinerary
+
+    claim_kwargs = {} if action_claim_seconds is None else {"lifetime_seconds": action_claim_seconds}
+    if not idempotency_service.claim_actions(action_key, **claim_kwargs):
+        print("Stage 4: Post-generation actions already fired for this request, skipping.")
+        return final_itinerary
+
     print("Stage 4: Starting post-generation actions (email, calendar)...")
     action_coroutines = []
     
@@ -134,8 +183,11 @@ async def create_full_itinerary(request: ChatRequest) -> str:
         )
         
     if action_coroutines:
-        # Run these tasks in the background
-        asyncio.gather(*action_coroutines)
+        # Run these tasks in the background, outside any replay session: they outlive the
+        # request, so in record mode they are deliberately left out of the recording
+        task = replay.create_detached_task(_run_post_generation_actions(action_coroutines))
+        _background_actions.add(task)
+        task.add_done_callback(_background_actions.discard)
         print("Stage 4: Actions are running in the background.")
 
     return final_itinerary
\ No newline at end of file
@@ -0,0 +1,211 @@
+# backend/services/model_router_service.py
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from core.config import FAST_MODEL, QUALITY_MODEL, MODEL_SLOW_TIMEOUT_SECONDS, MODEL_ROUTING_LOG_PATH
+
+# Task types the router knows about and the tier each one prefers
+TASK_PREFERENCES = {
+    "planning": FAST_MODEL,      # Short structured extraction, speed matters most
+    "synthesis": QUALITY_MODEL,  # Long-form itinerary writing benefits from the stronger model
+}
+
+# Prompts shorter than this don't need the quality tier
+SMALL_PROMPT_CHARS = 2000
+# Error rate (over the recent window) above which a model is avoided
+MAX_ERROR_RATE = 0.5
+# Calls a model needs in its window before its error rate or latency can exclude it
+MIN_SAMPLES_FOR_EXCLUSION = 5
+# While a model is excluded for errors or latency, one call per interval is still sent to it
+# as a probe, so it can recover once it's healthy again
+EXCLUSION_PROBE_INTERVAL_SECONDS = 120
+# How long a model is skipped after it reported a rate limit
+RATE_LIMIT_COOLDOWN_SECONDS = 60
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+# Routing reason prefix for a probe call to an excluded model
+PROBE_REASON = "probing excluded model"
+
+class ModelStats:
+    """ Rolling latency and error statistics for a single model. """
+    def __init__(self):
+        self.avg_latency: Optional[float] = None
+        self.recent_outcomes: deque = deque(maxlen=20)  # True = success
+        self.rate_limited_until: float = 0.0
+        self.next_probe_at: Optional[float] = None  # Set while excluded for errors or latency
+
+    def record(self, latency: float, success: bool):
+        self.recent_outcomes.append(success)
+        if success:
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            else:
+                self.avg_latency = LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.avg_latency
+
+    @property
+    def error_rate(self) -> float:
+        if not self.recent_outcomes:
+            return 0.0
+        return 1 - sum(self.recent_outcomes) / len(self.recent_outcomes)
+
+    @property
+    def is_rate_limited(self) -> bool:
+        return time.monotonic() < self.rate_limited_until
+
+_stats: dict[str, ModelStats] = {}
+# The most recent routing decisions and their outcomes, for tuning the policy
+routing_history: deque = deque(maxlen=500)
+# A single writer thread of its own, so routing log writes never queue behind (or hold up)
+# the shared blocking pool or the request itself
+_log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="routing-log")
+
+def _get_stats(model_name: str) -> ModelStats:
+    if model_name not in _stats:
+        _stats[model_name] = ModelStats()
+    return _stats[model_name]
+
+def choose_models(task: str, prompt: str, latency_budget: Optional[float] = None) -> tuple[list[str], str]:
+    """
+    Picks the ordered list of models to try for a call, plus the reason for the choice.
+    The first entry is the primary; the fast tier is always the last resort.
+    """
+    preferred = TASK_PREFERENCES.get(task, FAST_MODEL)
+    if preferred == FAST_MODEL:
+        return [FAST_MODEL], "task prefers fast tier"
+
+    stats = _get_stats(preferred)
+    if len(prompt) < SMALL_PROMPT_CHARS:
+        return [FAST_MODEL], "prompt is small"
+    if stats.is_rate_limited:
+        return [FAST_MODEL], f"{preferred} is rate-limited"
+
+    # A handful of calls isn't enough to judge a model: one early timeout would otherwise
+    # be a 100% error rate
+    reason = None
+    if len(stats.recent_outcomes) >= MIN_SAMPLES_FOR_EXCLUSION:
+        if stats.error_rate > MAX_ERROR_RATE:
+            reason = f"{preferred} error rate is {stats.error_rate:.0%}"
+        elif latency_budget is not None and stats.avg_latency is not None and stats.avg_latency > latency_budget:
+            reason = f"{preferred} averages {stats.avg_latency:.1f}s, over the {latency_budget:.1f}s budget"
+    if reason is None:
+        stats.next_probe_at = None
+        return [preferred, FAST_MODEL], "task prefers quality tier"
+
+    now = time.monotonic()
+    if stats.next_probe_at is None:
+        stats.next_probe_at = now + EXCLUSION_PROBE_INTERVAL_SECONDS
+    elif now >= stats.next_probe_at:
+        stats.next_probe_at = now + EXCLUSION_PROBE_INTERVAL_SECONDS
+        return [preferred, FAST_MODEL], f"{PROBE_REASON} ({reason})"
+    return [FAST_MODEL], reason
+
+def _append_routing_log(entry: dict):
+    try:
+        with open(MODEL_ROUTING_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Model Router: Could not write routing log: {e}")
+
+def _record_decision(entry: dict):
+    routing_history.append(entry)
+    if MODEL_ROUTING_LOG_PATH:
+        # Fire-and-forget: the write happens on the log writer thread, off the request's path
+        _log_writer.submit(_append_routing_log, entry)
+
+async def generate_content(task: str, prompt: str, deadline: Optional[float] = None):
+    """
+    Runs 'prompt' through the model chosen for 'task', falling back to the fast tier
+    when the primary model is slow, rate-limited or failing.
+
+    Args:
+        task: The task type, e.g. "planning" or "synthesis".
+        prompt: The full prompt text.
+        deadline: Optional time.monotonic() value by which the call must finish.
+            Every attempt, including the last resort, is cut off at the deadline.
+
+    Returns:
+        The Gemini response object from whichever model succeeded.
+    """
+    latency_budget = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+    candidates, reason = choose_models(task, prompt, latency_budget)
+    print(f"Model Router: '{task}' -> {candidates[0]} ({reason})")
+
+    last_error = None
+    for index, model_name in enumerate(candidates):
+        is_last = index == len(candidates) - 1
+        # The primary gets the slow-call threshold; the last resort gets whatever budget remains
+        timeout = None if is_last else MODEL_SLOW_TIMEOUT_SECONDS
+        limited_by_budget = False
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if timeout is None or remaining < timeout:
+                timeout, limited_by_budget = remaining, True
+
+        entry = {
+            "timestamp": time.time(),
+            "task": task,
+            "model": model_name,
+            "attempt": index + 1,
+            "reason": reason,
+            "prompt_chars": len(prompt),
+            "latency_budget": latency_budget,
+        }
+        if timeout is not None and timeout <= 0:
+            # Out of budget before calling: not the model's fault, so its stats are left alone
+            _record_decision({**entry, "latency": 0.0, "outcome": "budget_expired"})
+            raise asyncio.TimeoutError(f"Latency budget for '{task}' expired before calling {model_name}.")
+
+        stats = _get_stats(model_name)
+        started = time.monotonic()
+        outcome = "cancelled"
+        try:
+            model = genai.GenerativeModel(model_name)
+            response = await asyncio.wait_for(model.generate_content_async(prompt), timeout=timeout)
+            outcome = "ok"
+            return response
+        except asyncio.TimeoutError as e:
+            outcome, last_error = ("budget_expired" if limited_by_budget else "timeout"), e
+        except google_exceptions.ResourceExhausted as e:
+            outcome, last_error = "rate_limited", e
+            stats.rate_limited_until = time.monotonic() + RATE_LIMIT_COOLDOWN_SECONDS
+        except Exception as e:
+            outcome, last_error = "error", e
+        finally:
+            latency = time.monotonic() - started
+            # Budget cut-offs and cancellations say nothing about the model's health
+            if outcome not in ("budget_expired", "cancelled"):
+                probe_passed = (outcome == "ok" and index == 0 and reason.startswith(PROBE_REASON)
+                                and (latency_budget is None or latency <= latency_budget))
+                if probe_passed:
+                    # A healthy probe starts the model's window over, so it's routed to again
+                    stats.recent_outcomes.clear()
+                    stats.avg_latency = None
+                    stats.next_probe_at = None
+                stats.record(latency, success=outcome == "ok")
+            _record_decision({**entry, "latency": round(latency, 3), "outcome": outcome})
+        print(f"Model Router: {model_name} failed with '{outcome}' after {latency:.1f}s.")
+        if outcome == "budget_expired":
+            break
+
+    raise last_error
+
+def get_routing_stats() -> dict:
+    """
+    Summarizes per-model statistics and the most recent routing decisions.
+    """
+    return {
+        "models": {
+            name: {
+                "avg_latency": stats.avg_latency,
+                "error_rate": stats.error_rate,
+                "rate_limited": stats.is_rate_limited,
+            }
+            for name, stats in _stats.items()
+        },
+        "recent_decisions": list(routing_history)[-50:],
+    }
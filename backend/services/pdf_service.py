@@ -1,25 +1,80 @@
 # backend/services/pdf_service.py
+import os
+import tempfile
+import uuid
 from markdown_it import MarkdownIt
 from weasyprint import HTML, CSS
+from core.config import TEMP_DIR
+from core.blocking import offload
 
-def create_pdf_from_itinerary(markdown_text: str) -> bytes:
+# CSS for styling the PDF document
+PDF_CSS = """
+@page { size: A4; margin: 2cm; }
+body { font-family: 'Helvetica', sans-serif; font-size: 11pt; line-height: 1.5; }
+h1, h2, h3 { font-family: 'Times New Roman', serif; color: #333; }
+h1 { font-size: 22pt; border-bottom: 2px solid #eee; padding-bottom: 10px; margin-bottom: 20px;}
+h2 { font-size: 16pt; }
+h3 { font-size: 13pt; }
+strong { font-weight: bold; }
+"""
+
+def write_pdf_from_itinerary(markdown_text: str, target) -> None:
     """
-    Converts a markdown string into a styled PDF document.
+    Converts a markdown string into a styled PDF document and writes it
+    directly to 'target' (a filename or a writable binary file-like object),
+    so the rendered PDF is never held in memory as a separate bytes copy.
     """
     md = MarkdownIt()
     html_content = md.render(markdown_text)
-    
-    # CSS for styling the PDF document
-    css_string = """
-    @page { size: A4; margin: 2cm; }
-    body { font-family: 'Helvetica', sans-serif; font-size: 11pt; line-height: 1.5; }
-    h1, h2, h3 { font-family: 'Times New Roman', serif; color: #333; }
-    h1 { font-size: 22pt; border-bottom: 2px solid #eee; padding-bottom: 10px; margin-bottom: 20px;}
-    h2 { font-size: 16pt; }
-    h3 { font-size: 13pt; }
-    strong { font-weight: bold; }
-    """
-    
-    # Generate PDF from HTML and CSS
-    pdf_bytes = HTML(string=html_content).write_pdf(stylesheets=[CSS(string=css_string)])
-    return pdf_bytes
+    HTML(string=html_content).write_pdf(target=target, stylesheets=[CSS(string=PDF_CSS)])
+
+def _render_pdf_file(markdown_text: str, filepath: str) -> str:
+    try:
+        write_pdf_from_itinerary(markdown_text, filepath)
+    except Exception:
+        # Don't leave half-written files behind
+        remove_pdf_file(filepath)
+        raise
+    return filepath
+
+def create_pdf_file(markdown_text: str) -> str:
+    """
+    Renders the itinerary into a uniquely named PDF inside the publicly served TEMP_DIR
+    and returns its path. Only for files that must be reachable by URL (email attachments).
+    The caller owns the file and is responsible for removing it.
+    """
+    return _render_pdf_file(markdown_text, os.path.join(TEMP_DIR, f"{uuid.uuid4()}.pdf"))
+
+def create_private_pdf_file(markdown_text: str) -> str:
+    """
+    Renders the itinerary into a private temp file outside the static mount and returns its path.
+    The caller owns the file and is responsible for removing it.
+    """
+    fd, filepath = tempfile.mkstemp(prefix="itinerary-", suffix=".pdf")
+    os.close(fd)
+    return _render_pdf_file(markdown_text, filepath)
+
+def iter_pdf_file(filepath: str, chunk_size: int = 64 * 1024):
+    """
+    Yields the file in chunks and removes it afterwards, including when the
+    client disconnects and the stream is closed early.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        remove_pdf_file(filepath)
+
+def remove_pdf_file(filepath: str) -> None:
+    """
+    Deletes a PDF created by create_pdf_file, ignoring files that are already gone.
+    """
+    if os.path.exists(filepath):
+        os.remove(filepath)
+        print(f"Cleaned up temporary file: {os.path.basename(filepath)}")
+
+# Awaitable versions for async handlers, so WeasyPrint and file IO don't stall the event loop
+create_pdf_file_async = offload(create_pdf_file)
+create_private_pdf_file_async = offload(create_private_pdf_file)
+remove_pdf_file_async = offload(remove_pdf_file)
@@ -0,0 +1,88 @@
+# backend/services/research_planning_service.py
+# Turns the planner's general research topics into research agent prompts.
+# Shared by the itinerary pipeline and the skeleton warmer.
+import re
+from typing import Callable, Optional
+
+# Words or phrases that mark a research topic as already covered by a dedicated feature service
+FEATURE_TOPIC_KEYWORDS = {
+    "flights": {"flight", "flights", "airfare", "airfares", "airline", "airlines", "plane tickets"},
+    "hotels": {"hotel", "hotels", "accommodation", "accommodations", "lodging", "hostel", "hostels",
+               "where to stay", "places to stay", "place to stay"},
+    "youtube": {"youtube", "vlog", "vlogs", "travel video", "travel videos"},
+}
+# Topics with at most this many words are considered small and may be merged
+SMALL_TOPIC_MAX_WORDS = 8
+# Maximum number of small topics answered by a single research call
+MAX_TOPICS_PER_RESEARCH_CALL = 3
+
+def normalize_topic(topic) -> str:
+    """ Lowercases a topic and strips punctuation and extra whitespace. """
+    return " ".join(re.findall(r"[a-z0-9]+", str(topic).lower()))
+
+def mentions_any(normalized_topic: str, phrases: set) -> bool:
+    """ True if the normalized topic contains any of the phrases as whole words. """
+    padded = f" {normalized_topic} "
+    return any(f" {phrase} " in padded for phrase in phrases)
+
+def plan_research_tasks(
+    research_topics: list,
+    features: dict,
+    is_covered: Optional[Callable[[str], bool]] = None
+) -> list[str]:
+    """
+    Turns the planner's raw research topics into the prompts actually sent to the research agent:
+    duplicates and topics already covered by enabled feature services (or for which 'is_covered'
+    returns True) are dropped, and small topics are merged into multi-question research calls.
+    """
+    # A planner that returns a single string must not be iterated character by character
+    if isinstance(research_topics, str):
+        research_topics = [research_topics]
+    research_topics = research_topics or []
+
+    covered_keywords = set()
+    for feature, keywords in FEATURE_TOPIC_KEYWORDS.items():
+        if features.get(feature):
+            covered_keywords |= keywords
+
+    kept_topics = []
+    seen = set()
+    for topic in research_topics:
+        normalized = normalize_topic(topic)
+        # Word order doesn't matter: "Lisbon food" and "food Lisbon" are the same topic
+        word_set = frozenset(normalized.split())
+        if not word_set or word_set in seen:
+            continue
+        seen.add(word_set)
+        if mentions_any(normalized, covered_keywords) or (is_covered and is_covered(topic)):
+            print(f"  - Research planning: Dropping '{topic}', already covered.")
+            continue
+        kept_topics.append(str(topic).strip())
+
+    large_topics = [t for t in kept_topics if len(t.split()) > SMALL_TOPIC_MAX_WORDS]
+    small_topics = [t for t in kept_topics if len(t.split()) <= SMALL_TOPIC_MAX_WORDS]
+
+    research_prompts = list(large_topics)
+    for i in range(0, len(small_topics), MAX_TOPICS_PER_RESEARCH_CALL):
+        batch = small_topics[i:i + MAX_TOPICS_PER_RESEARCH_CALL]
+        if len(batch) == 1:
+            research_prompts.append(batch[0])
+        else:
+            questions = "\n".join(f"{n}. {topic}" for n, topic in enumerate(batch, start=1))
+            research_prompts.append(
+                "Research each of the following travel questions and answer them in order, "
+                f"with a short heading per question:\n{questions}"
+            )
+
+    print(f"  - Research planning: {len(research_topics)} topics -> {len(research_prompts)} research calls.")
+    return research_prompts
+
+def format_research_results(research_results: list) -> str:
+    """ Formats general research agent results as markdown bullet points. """
+    formatted = ""
+    for result in research_results:
+        if isinstance(result, Exception):
+            formatted += "- Research failed for one topic.\n"
+        else:
+            formatted += f"- {str(result.outputs.final_output)}\n"
+    return formatted
@@ -0,0 +1,183 @@
+# backend/services/skeleton_service.py
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+from typing import Optional
+from core.config import portia_agent, SKELETON_DESTINATIONS, SKELETON_REFRESH_SECONDS, SKELETON_DIR
+from core.blocking import run_blocking
+from services import research_planning_service, youtube_service
+
+# Bump when the skeleton format changes so old files are ignored
+SKELETON_SCHEMA_VERSION = 1
+# Skeletons older than this are not used for live requests
+SKELETON_MAX_AGE_SECONDS = 2 * SKELETON_REFRESH_SECONDS
+# Number of older versions kept on disk per destination
+SKELETON_VERSIONS_KEPT = 3
+
+# Generic research precomputed for every skeleton destination
+SKELETON_TOPICS = [
+    "Top sights and attractions in {destination}",
+    "Best neighborhoods to explore in {destination}",
+    "Local food and dishes to try in {destination}",
+    "Getting around {destination} with public transport",
+]
+# Phrases for which a planner topic is already answered by the generic skeleton research,
+# as long as the topic asks nothing else (see covers_topic).
+SKELETON_TOPIC_KEYWORDS = {
+    "top sights", "main sights", "sightseeing", "top attractions", "main attractions",
+    "tourist attractions", "famous landmarks", "things to see",
+    "best neighborhoods", "best neighbourhoods", "neighborhoods to explore", "neighbourhoods to explore",
+    "local food", "local dishes", "local cuisine", "what to eat",
+    "getting around", "public transport", "public transportation",
+}
+
+# Words a covered topic may still contain besides the phrase and the destination name
+COVERAGE_FILLER_WORDS = {"a", "an", "the", "in", "of", "to", "around", "for", "and", "best", "top", "main", "city"}
+
+# slug -> latest skeleton dict
+_skeletons: dict[str, dict] = {}
+_warmer_task: Optional[asyncio.Task] = None
+
+def _slugify(destination: str) -> str:
+    return "-".join(re.findall(r"[a-z0-9]+", str(destination).lower()))
+
+def get_skeleton(destination) -> Optional[dict]:
+    """
+    Returns the latest fresh skeleton for a destination, or None.
+    'Lisbon, Portugal' also matches a skeleton stored for 'Lisbon'.
+    """
+    if not destination:
+        return None
+    for candidate in (destination, str(destination).split(",")[0]):
+        skeleton = _skeletons.get(_slugify(candidate))
+        if skeleton and time.time() - skeleton["created_at"] < SKELETON_MAX_AGE_SECONDS:
+            return skeleton
+    return None
+
+def covers_topic(topic, destination) -> bool:
+    """
+    True if the generic skeleton research answers 'topic': it must mention one of the
+    SKELETON_TOPIC_KEYWORDS and ask nothing beyond that phrase, the destination's name and
+    filler words. "Top sights in Lisbon" is covered; "getting around Lisbon at night" is not.
+    """
+    normalized = research_planning_service.normalize_topic(topic)
+    destination_words = set(research_planning_service.normalize_topic(destination or "").split())
+    for phrase in SKELETON_TOPIC_KEYWORDS:
+        if not research_planning_service.mentions_any(normalized, {phrase}):
+            continue
+        leftover = set(normalized.split()) - set(phrase.split()) - destination_words - COVERAGE_FILLER_WORDS
+        if not leftover:
+            return True
+    return False
+
+async def build_skeleton(destination: str) -> dict:
+    """
+    Runs the generic research stage for a destination and returns it as a new skeleton version.
+    """
+    if not portia_agent:
+        raise Exception("Research Agent not initialized.")
+
+    topics = [topic.format(destination=destination) for topic in SKELETON_TOPICS]
+    research_prompts = research_planning_service.plan_research_tasks(topics, {})
+    results = await asyncio.gather(
+        youtube_service.find_youtube_vlogs(topic=f"travel in {destination}"),
+        *(portia_agent.arun(prompt) for prompt in research_prompts),
+        return_exceptions=True
+    )
+    youtube_result, research_results = results[0], results[1:]
+    if all(isinstance(result, Exception) for result in research_results):
+        # Keep serving the previous version rather than publishing an empty skeleton
+        raise Exception(f"All research calls failed for '{destination}'.")
+    # The YouTube service reports failures as text rather than raising
+    if isinstance(youtube_result, Exception) or str(youtube_result).startswith("Failed to retrieve"):
+        youtube_result = None
+
+    return {
+        "schema_version": SKELETON_SCHEMA_VERSION,
+        "destination": destination,
+        "version": None,  # Assigned from the files on disk when the skeleton is saved
+        "created_at": time.time(),
+        "general_research": research_planning_service.format_research_results(research_results),
+        "youtube": youtube_result,
+    }
+
+def _version_of(path: str) -> int:
+    return int(re.search(r"v(\d+)\.json$", path).group(1))
+
+def _stored_versions(destination_dir: str) -> list[str]:
+    """ Returns the skeleton files in a destination directory, oldest version first. """
+    return sorted(glob.glob(os.path.join(destination_dir, "v*.json")), key=_version_of)
+
+def _save_skeleton(skeleton: dict):
+    """
+    Writes the skeleton as the next version after the newest file on disk, whatever its
+    schema or readability, then prunes the oldest versions.
+    """
+    destination_dir = os.path.join(SKELETON_DIR, _slugify(skeleton["destination"]))
+    os.makedirs(destination_dir, exist_ok=True)
+    existing = _stored_versions(destination_dir)
+    skeleton["version"] = (_version_of(existing[-1]) + 1) if existing else 1
+    path = os.path.join(destination_dir, f"v{skeleton['version']}.json")
+    # Write to a temp file first so readers never see a half-written skeleton
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(skeleton, f)
+    os.replace(path + ".tmp", path)
+
+    for old_path in _stored_versions(destination_dir)[:-SKELETON_VERSIONS_KEPT]:
+        os.remove(old_path)
+
+def load_skeletons():
+    """
+    Loads the newest readable, schema-compatible version of each destination's skeleton
+    from SKELETON_DIR, falling back to older versions when newer ones can't be used.
+    """
+    for destination_dir in glob.glob(os.path.join(SKELETON_DIR, "*")):
+        for path in reversed(_stored_versions(destination_dir)):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    skeleton = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skeleton Service: Could not load {path}: {e}")
+                continue
+            if skeleton.get("schema_version") == SKELETON_SCHEMA_VERSION:
+                _skeletons[_slugify(skeleton["destination"])] = skeleton
+                break
+    print(f"Skeleton Service: Loaded {len(_skeletons)} stored skeletons.")
+
+async def refresh_skeleton(destination: str):
+    """ Rebuilds, stores and publishes the skeleton for one destination. """
+    skeleton = await build_skeleton(destination)
+    await run_blocking(_save_skeleton, skeleton)
+    _skeletons[_slugify(destination)] = skeleton
+    print(f"Skeleton Service: Refreshed '{destination}' (v{skeleton['version']}).")
+
+async def _warm_forever():
+    while True:
+        for destination in SKELETON_DESTINATIONS:
+            existing = _skeletons.get(_slugify(destination))
+            if existing and time.time() - existing["created_at"] < SKELETON_REFRESH_SECONDS:
+                continue
+            try:
+                # One destination at a time, so warming never competes hard with live requests
+                await refresh_skeleton(destination)
+            except Exception as e:
+                print(f"Skeleton Service Error: Failed to refresh '{destination}': {e}")
+        await asyncio.sleep(min(SKELETON_REFRESH_SECONDS, 15 * 60))
+
+async def start_warmer():
+    """
+    Loads stored skeletons and starts the background warmer for SKELETON_DESTINATIONS.
+    """
+    global _warmer_task
+    await run_blocking(load_skeletons)
+    if not SKELETON_DESTINATIONS or not portia_agent:
+        return
+    print(f"Skeleton Service: Warming {len(SKELETON_DESTINATIONS)} destinations in the background.")
+    _warmer_task = asyncio.create_task(_warm_forever())
+
+def stop_warmer():
+    if _warmer_task:
+        _warmer_task.cancel()